@@ -1,12 +1,22 @@
 from __future__ import annotations
 
+import hashlib
+import json
+import os
 from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
 
-from google.auth.transport.requests import Request
+from google.auth.transport.requests import AuthorizedSession, Request
 from google.oauth2.credentials import Credentials
+from requests.adapters import HTTPAdapter
 
 
 TOKEN_URI = "https://oauth2.googleapis.com/token"
+HTTP_POOL_SIZE = 64
+# Reuse a cached access token until this long before its (1 hour) expiry.
+TOKEN_EXPIRY_MARGIN = timedelta(minutes=5)
 
 
 @dataclass(frozen=True)
@@ -16,15 +26,80 @@ class GoogleOAuthSecrets:
     refresh_token: str
 
 
-def build_credentials(secrets: GoogleOAuthSecrets, *, scopes: list[str]) -> Credentials:
+def _token_cache_path(key: str) -> Path:
+    # One file per key, so scripts with different scope sets don't evict each other.
+    base = os.environ.get("XDG_CACHE_HOME", "").strip() or os.path.join(os.path.expanduser("~"), ".cache")
+    return Path(base) / "gphoto_backup" / f"token-{key.removeprefix('token:')}.json"
+
+
+def _token_cache_key(secrets: GoogleOAuthSecrets, scopes: list[str]) -> str:
+    raw = "\n".join([secrets.client_id, secrets.refresh_token, *sorted(scopes)])
+    return "token:" + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _load_cached_token(key: str) -> Optional[tuple[str, datetime, Optional[list[str]]]]:
+    try:
+        data = json.loads(_token_cache_path(key).read_text(encoding="utf-8"))
+        if data.get("key") != key:
+            return None
+        # google-auth keeps expiry as naive UTC
+        expiry = datetime.fromisoformat(data["expiry"])
+        token = data["token"]
+        granted_scopes = data.get("grantedScopes")
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if expiry - TOKEN_EXPIRY_MARGIN <= datetime.utcnow():
+        return None
+    return token, expiry, granted_scopes
+
+
+def _store_cached_token(key: str, creds: Credentials) -> None:
+    if not (creds.token and creds.expiry):
+        return
+    path = _token_cache_path(key)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "key": key,
+                    "token": creds.token,
+                    "expiry": creds.expiry.isoformat(),
+                    "grantedScopes": list(creds.granted_scopes or []) or None,
+                },
+                f,
+            )
+    except OSError:
+        pass  # cache is best-effort
+
+
+def build_credentials(secrets: GoogleOAuthSecrets, *, scopes: list[str], use_cache: bool = True) -> Credentials:
+    key = _token_cache_key(secrets, scopes)
+    cached = _load_cached_token(key) if use_cache else None
     creds = Credentials(
-        token=None,
+        token=cached[0] if cached else None,
+        expiry=cached[1] if cached else None,
         refresh_token=secrets.refresh_token,
         token_uri=TOKEN_URI,
         client_id=secrets.client_id,
         client_secret=secrets.client_secret,
         scopes=scopes,
+        granted_scopes=cached[2] if cached else None,
     )
+    if cached:
+        return creds
+
     creds.refresh(Request())
+    if use_cache:
+        _store_cached_token(key, creds)
     return creds
 
+
+def build_session(creds: Credentials, *, pool_size: int = HTTP_POOL_SIZE) -> AuthorizedSession:
+    # One pooled session shared by Photos API calls and media downloads so
+    # TCP/TLS connections are reused across requests and worker threads.
+    session = AuthorizedSession(creds)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount("https://", adapter)
+    return session
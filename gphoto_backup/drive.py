@@ -1,44 +1,148 @@
 from __future__ import annotations
 
+import base64
+import os
 import socket
-from typing import Optional
+import threading
+import zlib
+from typing import IO, Iterable, Optional
 
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
+from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload, MediaIoBaseUpload, MediaUpload
 from google.oauth2.credentials import Credentials
 
-from .utils import RetryPolicy, json_dumps_compact, sleep_backoff
+from .utils import RetryPolicy, chunked, json_dumps_compact, sleep_backoff
+
+
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+# appProperties["source"] values written by the backup scripts
+TAKEOUT_SOURCE = "google_takeout"
+PHOTOS_API_SOURCE = "google_photos_api"
+
+# Drive rejects larger batches with 500s more often; 25 is the practical ceiling.
+BATCH_MAX_REQUESTS = 25
+# IDs OR-ed into one files.list query; bounded to keep the query string short.
+EXISTENCE_QUERY_MAX_IDS = 20
+# Resumable chunk size for videos (must be a multiple of 256 KiB); fewer, larger
+# chunks mean fewer next_chunk() round-trips on high-latency links.
+VIDEO_CHUNKSIZE = 64 * 1024 * 1024
+# Below this a single multipart request beats a resumable session (POST + PUTs);
+# above the upper bound resumable is always used so a failure doesn't restart from zero.
+MULTIPART_MAX_BYTES = 5 * 1024 * 1024
+RESUMABLE_MIN_BYTES = 100 * 1024 * 1024
+
+
+# Descriptions longer than this may be moved (zlib + base64) into appProperties,
+# when the packed form is smaller than the inline JSON.
+DESCRIPTION_INLINE_MAX = 512
+DESCRIPTION_PROP_PREFIX = "metaB64_"
+# Drive limits: 124 bytes per appProperty key+value, 30 properties per app.
+APP_PROPERTY_MAX_BYTES = 124
+APP_PROPERTIES_MAX = 30
+
+
+def _description_fields(
+    description_obj: dict, app_properties: dict[str, str], *, compact: bool
+) -> tuple[str, dict[str, str]]:
+    desc = json_dumps_compact(description_obj)
+    if not compact or len(desc) <= DESCRIPTION_INLINE_MAX:
+        return desc, app_properties
+
+    packed = base64.b64encode(zlib.compress(desc.encode("utf-8"), 9)).decode("ascii")
+    part_len = APP_PROPERTY_MAX_BYTES - len(DESCRIPTION_PROP_PREFIX) - 2
+    parts = [packed[i : i + part_len] for i in range(0, len(packed), part_len)]
+    if len(parts) > APP_PROPERTIES_MAX - len(app_properties):
+        return desc, app_properties  # doesn't fit; keep it inline
+
+    packed_props = {f"{DESCRIPTION_PROP_PREFIX}{i:02d}": p for i, p in enumerate(parts)}
+    # Keep the media item id readable in the description itself.
+    stub_obj: dict = {"metaB64Parts": len(parts)}
+    media_item_id = (description_obj.get("mediaItem") or {}).get("id")
+    if media_item_id:
+        stub_obj["mediaItem"] = {"id": media_item_id}
+    stub = json_dumps_compact(stub_obj)
+    # High-entropy fields (baseUrl, ids) barely compress; only pack when it actually saves bytes.
+    packed_size = len(stub) + sum(len(k) + len(v) for k, v in packed_props.items())
+    if packed_size >= len(desc.encode("utf-8")):
+        return desc, app_properties
+
+    props = dict(app_properties)
+    props.update(packed_props)
+    return stub, props
+
+
+def unpack_description(app_properties: dict[str, str]) -> Optional[str]:
+    # Inverse of the compact description: the original JSON, or None if not packed.
+    keys = sorted(k for k in app_properties if k.startswith(DESCRIPTION_PROP_PREFIX))
+    if not keys:
+        return None
+    packed = "".join(app_properties[k] for k in keys)
+    return zlib.decompress(base64.b64decode(packed)).decode("utf-8")
+
+
+def _use_resumable(size: int, *, requested: bool) -> bool:
+    if size < MULTIPART_MAX_BYTES:
+        return False
+    if size > RESUMABLE_MIN_BYTES:
+        return True
+    return requested
 
 
 class DriveClient:
+    # Safe to share across threads: the underlying httplib2 transport is not,
+    # so each thread lazily builds its own service object.
     def __init__(self, *, credentials: Credentials) -> None:
-        self._svc = build("drive", "v3", credentials=credentials, cache_discovery=False)
+        self._credentials = credentials
+        self._local = threading.local()
+        self._folder_lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._index_lock = threading.Lock()
+        self._index_folder_locks: dict[str, threading.Lock] = {}
         self._date_folder_cache: dict[tuple[str, str], str] = {}
+        self._warmed_roots: set[str] = set()
         self._id_exists_cache: dict[str, bool] = {}
+        self._folder_index_cache: dict[str, frozenset[str]] = {}
+
+    @property
+    def _svc(self):
+        svc = getattr(self._local, "svc", None)
+        if svc is None:
+            svc = build("drive", "v3", credentials=self._credentials, cache_discovery=False)
+            self._local.svc = svc
+        return svc
 
     def ensure_date_folder(self, *, root_folder_id: str, date_folder_name: str) -> str:
         key = (root_folder_id, date_folder_name)
+        # Serialize lookup+create so concurrent workers don't create duplicate folders.
+        with self._folder_lock:
+            return self._ensure_date_folder_locked(key)
+
+    def _ensure_date_folder_locked(self, key: tuple[str, str]) -> str:
         if key in self._date_folder_cache:
             return self._date_folder_cache[key]
+        root_folder_id, date_folder_name = key
 
-        q = (
-            f"mimeType='application/vnd.google-apps.folder' and "
-            f"'{root_folder_id}' in parents and "
-            f"name='{date_folder_name}' and trashed=false"
-        )
-        resp = (
-            self._svc.files()
-            .list(q=q, spaces="drive", fields="files(id,name)", pageSize=1)
-            .execute()
-        )
-        files = resp.get("files", []) or []
+        files: list[dict] = []
+        # A warmed root already listed every folder it has, so a miss means "create".
+        if root_folder_id not in self._warmed_roots:
+            q = (
+                f"mimeType='{FOLDER_MIME_TYPE}' and "
+                f"'{root_folder_id}' in parents and "
+                f"name='{date_folder_name}' and trashed=false"
+            )
+            resp = (
+                self._svc.files()
+                .list(q=q, spaces="drive", fields="files(id)", pageSize=1)
+                .execute()
+            )
+            files = resp.get("files", []) or []
         if files:
             folder_id = files[0]["id"]
         else:
             meta = {
                 "name": date_folder_name,
-                "mimeType": "application/vnd.google-apps.folder",
+                "mimeType": FOLDER_MIME_TYPE,
                 "parents": [root_folder_id],
             }
             folder = self._svc.files().create(body=meta, fields="id").execute()
@@ -47,9 +151,27 @@ class DriveClient:
         self._date_folder_cache[key] = folder_id
         return folder_id
 
+    def warm_date_folders(self, *, root_folder_id: str) -> None:
+        # List every subfolder of root once so ensure_date_folder() needs no lookups.
+        folders = self.list_children(
+            folder_id=root_folder_id,
+            fields="nextPageToken,files(id,name)",
+            mime_type=FOLDER_MIME_TYPE,
+        )
+        with self._folder_lock:
+            for f in folders:
+                self._date_folder_cache.setdefault((root_folder_id, f["name"]), f["id"])
+            self._warmed_roots.add(root_folder_id)
+
+    def cached_existence(self, *, media_item_id: str) -> Optional[bool]:
+        # What already_uploaded() would answer without a Drive call; None if unknown.
+        with self._cache_lock:
+            return self._id_exists_cache.get(media_item_id)
+
     def already_uploaded(self, *, media_item_id: str) -> bool:
-        if media_item_id in self._id_exists_cache:
-            return self._id_exists_cache[media_item_id]
+        with self._cache_lock:
+            if media_item_id in self._id_exists_cache:
+                return self._id_exists_cache[media_item_id]
 
         q = (
             "trashed=false and "
@@ -61,13 +183,85 @@ class DriveClient:
             .execute()
         )
         exists = bool(resp.get("files", []) or [])
-        self._id_exists_cache[media_item_id] = exists
+        with self._cache_lock:
+            self._id_exists_cache[media_item_id] = exists
         return exists
 
+    def prefetch_existence(self, *, media_item_ids: Iterable[str], policy: RetryPolicy = RetryPolicy()) -> None:
+        # Warm the already_uploaded() cache. IDs are OR-ed together into grouped
+        # list queries, and the groups are sent through one batch request. IDs
+        # whose group fails (or is truncated) stay uncached and fall back to a
+        # single lookup later.
+        with self._cache_lock:
+            pending = [m for m in dict.fromkeys(media_item_ids) if m not in self._id_exists_cache]
+
+        groups = list(chunked(pending, EXISTENCE_QUERY_MAX_IDS))
+        for batch_groups in chunked(groups, BATCH_MAX_REQUESTS):
+            found: dict[str, bool] = {}
+
+            def _callback(request_id: str, response: dict, exception: Optional[Exception]) -> None:
+                if exception is not None or response.get("nextPageToken"):
+                    return
+                ids = batch_groups[int(request_id)]
+                hits = {
+                    (f.get("appProperties") or {}).get("mediaItemId") for f in response.get("files", []) or []
+                }
+                for mid in ids:
+                    found[mid] = mid in hits
+
+            def _once() -> None:
+                found.clear()
+                batch = self._svc.new_batch_http_request(callback=_callback)
+                for i, ids in enumerate(batch_groups):
+                    batch.add(self._media_items_list_request(ids), request_id=str(i))
+                batch.execute()
+
+            self._execute_with_retries(_once, policy=policy)
+            with self._cache_lock:
+                self._id_exists_cache.update(found)
+
+    def _media_items_list_request(self, media_item_ids: list[str]):
+        clauses = " or ".join(
+            f"appProperties has {{ key='mediaItemId' and value='{mid}' }}" for mid in media_item_ids
+        )
+        return self._svc.files().list(
+            q=f"trashed=false and ({clauses})",
+            spaces="drive",
+            fields="nextPageToken,files(id,appProperties(mediaItemId))",
+            pageSize=1000,
+        )
+
+    def index_folder(self, *, folder_id: str) -> frozenset[str]:
+        # mediaItemId values of files directly under folder_id, listed once per run.
+        # The listing runs under a per-folder lock so workers on other folders
+        # (or on folders already indexed) never wait behind it.
+        with self._index_lock:
+            if folder_id in self._folder_index_cache:
+                return self._folder_index_cache[folder_id]
+            folder_lock = self._index_folder_locks.setdefault(folder_id, threading.Lock())
+
+        with folder_lock:
+            with self._index_lock:
+                if folder_id in self._folder_index_cache:
+                    return self._folder_index_cache[folder_id]
+            children = self.list_children(
+                folder_id=folder_id, fields="nextPageToken,files(id,appProperties(mediaItemId))"
+            )
+            ids = frozenset(
+                mid for f in children if (mid := (f.get("appProperties") or {}).get("mediaItemId"))
+            )
+            with self._index_lock:
+                self._folder_index_cache[folder_id] = ids
+
+        with self._cache_lock:
+            self._id_exists_cache.update(dict.fromkeys(ids, True))
+        return ids
+
     def already_uploaded_by_sha256(self, *, sha256_hex: str) -> bool:
         key = f"sha256:{sha256_hex}"
-        if key in self._id_exists_cache:
-            return self._id_exists_cache[key]
+        with self._cache_lock:
+            if key in self._id_exists_cache:
+                return self._id_exists_cache[key]
 
         q = (
             "trashed=false and "
@@ -79,27 +273,64 @@ class DriveClient:
             .execute()
         )
         exists = bool(resp.get("files", []) or [])
-        self._id_exists_cache[key] = exists
+        with self._cache_lock:
+            self._id_exists_cache[key] = exists
         return exists
 
+    def list_existing_sha256s(
+        self,
+        *,
+        sources: Iterable[str] = (TAKEOUT_SOURCE, PHOTOS_API_SOURCE),
+        page_size: int = 1000,
+        policy: RetryPolicy = RetryPolicy(),
+    ) -> set[str]:
+        # One paginated listing of every sha256 we have uploaded, for local membership tests.
+        clauses = " or ".join(f"appProperties has {{ key='source' and value='{src}' }}" for src in sources)
+        out: set[str] = set()
+        page_token: Optional[str] = None
+        while True:
+            request = self._svc.files().list(
+                q=f"trashed=false and ({clauses})",
+                spaces="drive",
+                fields="nextPageToken,files(appProperties(sha256))",
+                pageSize=page_size,
+                pageToken=page_token,
+            )
+            # The listing can span many pages; retry each so one transient error doesn't lose the scan.
+            resp = self._execute_with_retries(request.execute, policy=policy)
+            for f in resp.get("files", []) or []:
+                sha_hex = (f.get("appProperties") or {}).get("sha256")
+                if sha_hex:
+                    out.add(sha_hex)
+            page_token = resp.get("nextPageToken")
+            if not page_token:
+                break
+        return out
+
     def list_children(
         self,
         *,
         folder_id: str,
         page_size: int = 200,
         fields: str = "nextPageToken,files(id,name,mimeType,modifiedTime,size,appProperties)",
+        mime_type: Optional[str] = None,
+        order_by: Optional[str] = None,
     ) -> list[dict]:
+        q = f"'{folder_id}' in parents and trashed=false"
+        if mime_type:
+            q += f" and mimeType='{mime_type}'"
         out: list[dict] = []
         page_token: Optional[str] = None
         while True:
             resp = (
                 self._svc.files()
                 .list(
-                    q=f"'{folder_id}' in parents and trashed=false",
+                    q=q,
                     spaces="drive",
                     fields=fields,
                     pageSize=page_size,
                     pageToken=page_token,
+                    orderBy=order_by,
                 )
                 .execute()
             )
@@ -137,13 +368,18 @@ class DriveClient:
         policy: RetryPolicy = RetryPolicy(max_retries=5),
         resumable: bool = False,
         chunksize: int = 10 * 1024 * 1024,
+        compact_description: bool = False,
     ) -> str:
+        description, app_properties = _description_fields(
+            description_obj, app_properties, compact=compact_description
+        )
         body = {
             "name": filename,
             "parents": [parent_folder_id],
             "appProperties": app_properties,
-            "description": json_dumps_compact(description_obj),
+            "description": description,
         }
+        resumable = _use_resumable(os.path.getsize(local_path), requested=resumable)
         if resumable:
             media = MediaFileUpload(
                 local_path,
@@ -158,14 +394,53 @@ class DriveClient:
                 resumable=False,
             )
 
+        return self._create_with_media(body=body, media=media, policy=policy, resumable=resumable)
+
+    def upload_stream(
+        self,
+        *,
+        fileobj: IO[bytes],
+        filename: str,
+        mime_type: str,
+        parent_folder_id: str,
+        app_properties: dict[str, str],
+        description_obj: dict,
+        policy: RetryPolicy = RetryPolicy(max_retries=5),
+        resumable: bool = False,
+        chunksize: int = 10 * 1024 * 1024,
+        compact_description: bool = False,
+    ) -> str:
+        # fileobj must be seekable (googleapiclient sizes the media up front and
+        # rewinds on retry); an in-memory/spooled buffer avoids a temp file.
+        description, app_properties = _description_fields(
+            description_obj, app_properties, compact=compact_description
+        )
+        body = {
+            "name": filename,
+            "parents": [parent_folder_id],
+            "appProperties": app_properties,
+            "description": description,
+        }
+        pos = fileobj.tell()
+        size = fileobj.seek(0, os.SEEK_END) - pos
+        fileobj.seek(pos)
+        resumable = _use_resumable(size, requested=resumable)
+        if resumable:
+            media = MediaIoBaseUpload(fileobj, mimetype=mime_type, resumable=True, chunksize=chunksize)
+        else:
+            media = MediaIoBaseUpload(fileobj, mimetype=mime_type, resumable=False)
+        return self._create_with_media(body=body, media=media, policy=policy, resumable=resumable)
+
+    def _create_with_media(self, *, body: dict, media: MediaUpload, policy: RetryPolicy, resumable: bool) -> str:
         request = self._svc.files().create(body=body, media_body=media, fields="id")
         if not resumable:
             # googleapiclient has internal retries, but keep ours consistent
-            return self._execute_with_retries(lambda: request.execute(), policy=policy)
+            return self._execute_with_retries(lambda: request.execute()["id"], policy=policy)
 
         # Resumable upload loop with explicit retries/backoff
         response = None
         last_err: Optional[BaseException] = None
+        prev_sleep_s: Optional[float] = None
         for attempt in range(policy.max_retries + 1):
             try:
                 while response is None:
@@ -176,7 +451,7 @@ class DriveClient:
                 last_err = e
                 if attempt >= policy.max_retries:
                     break
-                sleep_backoff(attempt, policy)
+                prev_sleep_s = sleep_backoff(policy, prev_sleep_s=prev_sleep_s, err=e)
                 # next_chunk() resumes automatically if the request is resumable
 
         assert last_err is not None
@@ -184,6 +459,7 @@ class DriveClient:
 
     def _execute_with_retries(self, fn, *, policy: RetryPolicy):
         last_err: Optional[BaseException] = None
+        prev_sleep_s: Optional[float] = None
         for attempt in range(policy.max_retries + 1):
             try:
                 return fn()
@@ -191,7 +467,7 @@ class DriveClient:
                 last_err = e
                 if attempt >= policy.max_retries:
                     break
-                sleep_backoff(attempt, policy)
+                prev_sleep_s = sleep_backoff(policy, prev_sleep_s=prev_sleep_s, err=e)
         assert last_err is not None
         raise last_err
 
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import re
 import smtplib
 from dataclasses import dataclass
 from email.message import EmailMessage
@@ -14,13 +15,65 @@ class SmtpConfig:
     password: str
 
 
+_RECIPIENT_SPLIT = re.compile(r"\s*[,;]\s*")
+
+
 def _normalize_recipients(to_addrs: str | Iterable[str]) -> list[str]:
     if isinstance(to_addrs, str):
-        parts = [p.strip() for p in to_addrs.replace(";", ",").split(",")]
-        return [p for p in parts if p]
+        return [p for p in _RECIPIENT_SPLIT.split(to_addrs.strip()) if p]
     return [x.strip() for x in to_addrs if x and x.strip()]
 
 
+class SmtpSession:
+    # One SMTP connection (STARTTLS + LOGIN once) for sending several messages.
+    def __init__(self, smtp: SmtpConfig, *, timeout_s: float = 30.0) -> None:
+        self._smtp = smtp
+        self._timeout_s = timeout_s
+        self._conn: smtplib.SMTP | None = None
+
+    def __enter__(self) -> "SmtpSession":
+        conn = smtplib.SMTP(self._smtp.host, self._smtp.port, timeout=self._timeout_s)
+        try:
+            conn.ehlo()
+            conn.starttls()
+            conn.ehlo()
+            conn.login(self._smtp.user, self._smtp.password)
+        except BaseException:
+            conn.close()
+            raise
+        self._conn = conn
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        try:
+            conn.quit()
+        except smtplib.SMTPServerDisconnected:
+            pass
+        finally:
+            conn.close()
+
+    def send(
+        self,
+        *,
+        to_addrs: str | Iterable[str],
+        subject: str,
+        body_text: str,
+        from_addr: str | None = None,
+    ) -> None:
+        if self._conn is None:
+            raise RuntimeError("SmtpSession is not open; use it as a context manager.")
+        msg = EmailMessage()
+        msg["Subject"] = subject
+        msg["From"] = from_addr or self._smtp.user
+        recipients = _normalize_recipients(to_addrs)
+        msg["To"] = ", ".join(recipients)
+        msg.set_content(body_text)
+        self._conn.send_message(msg, from_addr=msg["From"], to_addrs=recipients)
+
+
 def send_email(
     *,
     smtp: SmtpConfig,
@@ -29,17 +82,5 @@ def send_email(
     body_text: str,
     from_addr: str | None = None,
 ) -> None:
-    msg = EmailMessage()
-    msg["Subject"] = subject
-    msg["From"] = from_addr or smtp.user
-    recipients = _normalize_recipients(to_addrs)
-    msg["To"] = ", ".join(recipients)
-    msg.set_content(body_text)
-
-    with smtplib.SMTP(smtp.host, smtp.port, timeout=30) as s:
-        s.ehlo()
-        s.starttls()
-        s.ehlo()
-        s.login(smtp.user, smtp.password)
-        s.send_message(msg, from_addr=msg["From"], to_addrs=recipients)
-
+    with SmtpSession(smtp) as session:
+        session.send(to_addrs=to_addrs, subject=subject, body_text=body_text, from_addr=from_addr)
@@ -8,7 +8,7 @@ import requests
 from google.auth.credentials import Credentials as BaseCredentials
 from google.auth.transport.requests import AuthorizedSession
 
-from .utils import RetryPolicy, with_retries
+from .utils import RetryPolicy, prefetched, with_retries
 
 
 PHOTOS_API = "https://photoslibrary.googleapis.com/v1"
@@ -25,9 +25,15 @@ class PhotosSearchResult:
 
 
 class PhotosClient:
-    def __init__(self, *, credentials: BaseCredentials, timeout_s: float = 30.0) -> None:
+    def __init__(
+        self,
+        *,
+        credentials: BaseCredentials,
+        timeout_s: float = 30.0,
+        session: Optional[AuthorizedSession] = None,
+    ) -> None:
         self._timeout_s = timeout_s
-        self._session = AuthorizedSession(credentials)
+        self._session = session or AuthorizedSession(credentials)
 
     def search_favorites_by_date_range(
         self,
@@ -36,7 +42,24 @@ class PhotosClient:
         end_date: date,
         page_size: int = 100,
         policy: RetryPolicy = RetryPolicy(),
+        prefetch_pages: int = 2,
     ) -> Iterator[dict]:
+        # Pages are fetched on a background thread up to prefetch_pages ahead, so the
+        # next page's round-trip overlaps with processing of the current one.
+        pages = self._iter_pages(start_date=start_date, end_date=end_date, page_size=page_size, policy=policy)
+        if prefetch_pages > 0:
+            pages = prefetched(pages, depth=prefetch_pages)
+        for result in pages:
+            yield from result.media_items
+
+    def _iter_pages(
+        self,
+        *,
+        start_date: date,
+        end_date: date,
+        page_size: int,
+        policy: RetryPolicy,
+    ) -> Iterator[PhotosSearchResult]:
         page_token: Optional[str] = None
         while True:
             result = self._search_once(
@@ -46,8 +69,7 @@ class PhotosClient:
                 page_token=page_token,
                 policy=policy,
             )
-            for item in result.media_items:
-                yield item
+            yield result
             if not result.next_page_token:
                 break
             page_token = result.next_page_token
@@ -1,20 +1,33 @@
 from __future__ import annotations
 
+import hashlib
 import json
-import os
+import queue
 import random
+import sys
+import threading
 import time
 from dataclasses import dataclass
 from datetime import date, datetime
-from typing import Callable, Iterable, Optional, TypeVar
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from itertools import islice
+from typing import IO, Callable, Iterable, Iterator, Optional, TypeVar
 
 import requests
 from dateutil.relativedelta import relativedelta
 from zoneinfo import ZoneInfo
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
 
 KST = ZoneInfo("Asia/Seoul")
 T = TypeVar("T")
+# Read size for the pre-3.11 hashing fallback (file_digest picks its own).
+HASH_CHUNK_BYTES = 4 * 1024 * 1024
 
 
 def kst_today() -> date:
@@ -40,16 +53,39 @@ def recent_month_dates(reference_kst: Optional[date] = None, months: int = 1) ->
     return start, end
 
 
+@lru_cache(maxsize=8192)
 def iso_to_kst_date(iso_dt: str) -> str:
-    # creationTime is RFC3339, e.g. 2020-01-02T03:04:05Z
-    dt = datetime.fromisoformat(iso_dt.replace("Z", "+00:00"))
-    return dt.astimezone(KST).date().isoformat()
+    # creationTime is RFC3339, e.g. 2020-01-02T03:04:05Z (fromisoformat accepts "Z" on 3.11+)
+    if sys.version_info < (3, 11):
+        iso_dt = iso_dt.replace("Z", "+00:00")
+    return datetime.fromisoformat(iso_dt).astimezone(KST).date().isoformat()
+
+
+def sha256_fileobj(fileobj: IO[bytes]) -> str:
+    # hashlib.file_digest (3.11+) hashes in C; older interpreters use a large-chunk loop.
+    if hasattr(hashlib, "file_digest"):
+        return hashlib.file_digest(fileobj, "sha256").hexdigest()
+    h = hashlib.sha256()
+    for chunk in iter(lambda: fileobj.read(HASH_CHUNK_BYTES), b""):
+        h.update(chunk)
+    return h.hexdigest()
 
 
 def json_dumps_compact(obj: object) -> str:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        except TypeError:
+            pass  # e.g. ints beyond 64 bits; stdlib handles them
     return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
 
 
+def json_loads(data: bytes | str) -> object:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
 @dataclass(frozen=True)
 class RetryPolicy:
     max_retries: int = 5
@@ -57,10 +93,46 @@ class RetryPolicy:
     max_sleep_s: float = 30.0
 
 
-def sleep_backoff(attempt: int, policy: RetryPolicy) -> None:
-    # Full jitter exponential backoff
-    cap = min(policy.max_sleep_s, policy.base_sleep_s * (2**attempt))
-    time.sleep(random.uniform(0, cap))
+def retry_after_s(err: BaseException) -> Optional[float]:
+    # Server-requested delay from a Retry-After header, for requests.HTTPError
+    # (err.response.headers) and googleapiclient HttpError (err.resp).
+    headers = None
+    response = getattr(err, "response", None)
+    if response is not None:
+        headers = getattr(response, "headers", None)
+    if headers is None:
+        headers = getattr(err, "resp", None)
+    if headers is None:
+        return None
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.now(tz=when.tzinfo)).total_seconds())
+
+
+def sleep_backoff(
+    policy: RetryPolicy,
+    *,
+    prev_sleep_s: Optional[float] = None,
+    err: Optional[BaseException] = None,
+) -> float:
+    # Decorrelated jitter backoff; never sleeps less than a server-provided
+    # Retry-After. Returns the sleep so callers can feed it into the next attempt.
+    prev = prev_sleep_s if prev_sleep_s is not None else policy.base_sleep_s
+    sleep_s = min(policy.max_sleep_s, random.uniform(policy.base_sleep_s, prev * 3))
+    server_s = retry_after_s(err) if err is not None else None
+    if server_s is not None:
+        sleep_s = max(sleep_s, server_s)
+    time.sleep(sleep_s)
+    return sleep_s
 
 
 def with_retries(
@@ -70,6 +142,7 @@ def with_retries(
     policy: RetryPolicy,
 ) -> T:
     last_err: Optional[BaseException] = None
+    prev_sleep_s: Optional[float] = None
     for attempt in range(policy.max_retries + 1):
         try:
             return fn()
@@ -77,39 +150,80 @@ def with_retries(
             last_err = e
             if attempt >= policy.max_retries:
                 break
-            sleep_backoff(attempt, policy)
+            prev_sleep_s = sleep_backoff(policy, prev_sleep_s=prev_sleep_s, err=e)
     assert last_err is not None
     raise last_err
 
 
-def download_to_path(
+def download_to_fileobj(
     *,
     url: str,
-    path: str,
+    fileobj: IO[bytes],
     timeout_s: tuple[float, float] = (10.0, 60.0),
     policy: RetryPolicy = RetryPolicy(),
+    session: Optional[requests.Session] = None,
 ) -> None:
+    # fileobj must be seekable; it is rewound and truncated before each attempt.
+    http = session or requests
+
     def _once() -> None:
-        with requests.get(url, stream=True, timeout=timeout_s) as r:
+        with http.get(url, stream=True, timeout=timeout_s) as r:
             r.raise_for_status()
-            d = os.path.dirname(path)
-            if d:
-                os.makedirs(d, exist_ok=True)
-            with open(path, "wb") as f:
-                for chunk in r.iter_content(chunk_size=1024 * 1024):
-                    if chunk:
-                        f.write(chunk)
+            fileobj.seek(0)
+            fileobj.truncate()
+            for chunk in r.iter_content(chunk_size=1024 * 1024):
+                if chunk:
+                    fileobj.write(chunk)
+        fileobj.seek(0)
 
     with_retries(_once, retry_on=(requests.RequestException,), policy=policy)
 
 
+_PREFETCH_DONE = object()
+
+
+def prefetched(iterable: Iterable[T], *, depth: int = 2) -> Iterator[T]:
+    # Drive iterable on a background thread, staying at most `depth` items ahead.
+    # Exceptions from the producer are re-raised in the consumer.
+    q: queue.Queue = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+
+    def _put(x: object) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(x, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce() -> None:
+        try:
+            for x in iterable:
+                if not _put(x):
+                    return
+        except BaseException as e:
+            _put(e)
+            return
+        _put(_PREFETCH_DONE)
+
+    t = threading.Thread(target=_produce, name="prefetch", daemon=True)
+    t.start()
+    try:
+        while True:
+            x = q.get()
+            if x is _PREFETCH_DONE:
+                return
+            if isinstance(x, BaseException):
+                raise x
+            yield x
+    finally:
+        stop.set()
+
+
 def chunked(iterable: Iterable[T], size: int) -> Iterable[list[T]]:
-    batch: list[T] = []
-    for x in iterable:
-        batch.append(x)
-        if len(batch) >= size:
-            yield batch
-            batch = []
-    if batch:
+    # islice keeps the per-item loop in C (itertools.batched would yield tuples).
+    it = iter(iterable)
+    while batch := list(islice(it, size)):
         yield batch
 
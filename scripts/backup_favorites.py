@@ -4,6 +4,7 @@ import argparse
 import os
 import sys
 import tempfile
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
 from dataclasses import dataclass
 from datetime import date
 
@@ -14,22 +15,30 @@ _REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if _REPO_ROOT not in sys.path:
     sys.path.insert(0, _REPO_ROOT)
 
-from gphoto_backup.auth import GoogleOAuthSecrets, build_credentials
-from gphoto_backup.drive import DriveClient
+from gphoto_backup.auth import GoogleOAuthSecrets, build_credentials, build_session
+from gphoto_backup.drive import PHOTOS_API_SOURCE, VIDEO_CHUNKSIZE, DriveClient
 from gphoto_backup.email_utils import SmtpConfig, send_email
 from gphoto_backup.photos import PhotosClient
 from gphoto_backup.utils import (
     RetryPolicy,
+    chunked,
+    download_to_fileobj,
     iso_to_kst_date,
     json_dumps_compact,
     kst_today,
     month_range_to_dates,
     recent_month_dates,
+    sha256_fileobj,
 )
 
 
 PHOTOS_SCOPE = "https://www.googleapis.com/auth/photoslibrary.readonly"
 DRIVE_SCOPE = "https://www.googleapis.com/auth/drive"
+SPOOL_MAX_BYTES = 64 * 1024 * 1024
+# Matches the Photos API search page size.
+PAGE_SIZE = 100
+# Keep concurrency modest to stay under Drive's per-user write rate limit.
+DEFAULT_WORKERS = 4
 
 
 @dataclass
@@ -81,6 +90,12 @@ def _build_arg_parser() -> argparse.ArgumentParser:
         help="For schedule mode: how many recent months to include (default: 1).",
     )
     p.add_argument("--dry-run", action="store_true", help="List and count only; no download/upload.")
+    p.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"Concurrent download/upload workers (default: {DEFAULT_WORKERS}).",
+    )
     return p
 
 
@@ -97,6 +112,96 @@ def _resolve_range(args: argparse.Namespace) -> tuple[date, date, str]:
     return start, end, label
 
 
+def _process_item(
+    *,
+    item: dict,
+    drive: DriveClient,
+    session: requests.Session,
+    drive_root_folder_id: str,
+    dry_run: bool,
+) -> tuple[str, str | None]:
+    # Returns (Counts field to increment, failure line or None); runs on a worker thread.
+    media_item_id = item.get("id")
+    filename = item.get("filename") or f"{media_item_id}"
+    mime_type = item.get("mimeType") or "application/octet-stream"
+    base_url = item.get("baseUrl")
+    product_url = item.get("productUrl")
+    creation_time = (item.get("mediaMetadata") or {}).get("creationTime")
+
+    if not (media_item_id and base_url and creation_time):
+        return "failed", json_dumps_compact({"reason": "missing_required_fields", "item": item})
+
+    try:
+        kst_date = iso_to_kst_date(creation_time)
+        folder_id = drive.ensure_date_folder(root_folder_id=drive_root_folder_id, date_folder_name=kst_date)
+
+        # The page-level prefetch usually answers already; on a miss the folder
+        # listing covers the common case locally, and the global lookup still
+        # catches items filed under a different date folder.
+        exists = drive.cached_existence(media_item_id=media_item_id)
+        if exists is None:
+            exists = media_item_id in drive.index_folder(folder_id=folder_id) or drive.already_uploaded(
+                media_item_id=media_item_id
+            )
+        if exists:
+            return "skipped", None
+
+        if dry_run:
+            return "skipped", None
+
+        suffix = "=d" if mime_type.startswith("image/") else "=dv" if mime_type.startswith("video/") else "=d"
+        download_url = f"{base_url}{suffix}"
+
+        is_video = mime_type.startswith("video/")
+        dl_policy = RetryPolicy(max_retries=6, base_sleep_s=1.0, max_sleep_s=60.0) if is_video else RetryPolicy()
+        timeout_s = (10.0, 300.0) if is_video else (10.0, 60.0)
+
+        # Spool in memory (spilling to disk only for large videos) instead of
+        # staging every item in a temp file before upload.
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as buf:
+            download_to_fileobj(
+                url=download_url, fileobj=buf, timeout_s=timeout_s, policy=dl_policy, session=session
+            )
+            sha_hex = sha256_fileobj(buf)
+            buf.seek(0)
+            # Same bytes may already be in Drive under another media item id (or from Takeout).
+            if drive.already_uploaded_by_sha256(sha256_hex=sha_hex):
+                return "skipped", None
+
+            description_obj = {
+                "mediaItem": {
+                    "id": media_item_id,
+                    "filename": filename,
+                    "productUrl": product_url,
+                    "baseUrl": base_url,
+                    "creationTime": creation_time,
+                    "mimeType": mime_type,
+                }
+            }
+            file_id = drive.upload_stream(
+                fileobj=buf,
+                filename=filename,
+                mime_type=mime_type,
+                parent_folder_id=folder_id,
+                app_properties={
+                    "source": PHOTOS_API_SOURCE,
+                    "mediaItemId": media_item_id,
+                    "creationTime": creation_time,
+                    "mimeType": mime_type,
+                    "sha256": sha_hex,
+                },
+                description_obj=description_obj,
+                policy=RetryPolicy(max_retries=8, base_sleep_s=1.0, max_sleep_s=90.0) if is_video else RetryPolicy(),
+                resumable=is_video,
+                chunksize=VIDEO_CHUNKSIZE,
+                compact_description=True,
+            )
+            _ = file_id
+        return "uploaded", None
+    except Exception as e:  # keep going for the rest
+        return "failed", json_dumps_compact({"id": media_item_id, "error": repr(e)})
+
+
 def main() -> int:
     args = _build_arg_parser().parse_args()
     start_date, end_date, range_label = _resolve_range(args)
@@ -109,12 +214,15 @@ def main() -> int:
     drive_root_folder_id = _env("DRIVE_FOLDER_ID")
 
     creds = build_credentials(oauth, scopes=[PHOTOS_SCOPE, DRIVE_SCOPE])
-    token_scopes = []
-    try:
-        if creds.token:
-            token_scopes = _get_access_token_scopes(creds.token)
-    except Exception:
-        token_scopes = []
+    # The token endpoint reports granted scopes on refresh; only ask tokeninfo
+    # when they are unknown (e.g. a cached token from an older cache entry).
+    token_scopes = list(creds.granted_scopes or [])
+    if not token_scopes:
+        try:
+            if creds.token:
+                token_scopes = _get_access_token_scopes(creds.token)
+        except Exception:
+            token_scopes = []
 
     if PHOTOS_SCOPE not in token_scopes:
         raise RuntimeError(
@@ -123,87 +231,57 @@ def main() -> int:
             "(Re-issue refresh token with photoslibrary.readonly and update secrets.)"
         )
 
-    photos = PhotosClient(credentials=creds)
+    session = build_session(creds)
+    photos = PhotosClient(credentials=creds, session=session)
     drive = DriveClient(credentials=creds)
 
+    drive.warm_date_folders(root_folder_id=drive_root_folder_id)
+
     counts = Counts()
     failures: list[str] = []
 
-    for item in photos.search_favorites_by_date_range(start_date=start_date, end_date=end_date):
-        counts.total += 1
-
-        media_item_id = item.get("id")
-        filename = item.get("filename") or f"{media_item_id}"
-        mime_type = item.get("mimeType") or "application/octet-stream"
-        base_url = item.get("baseUrl")
-        product_url = item.get("productUrl")
-        creation_time = (item.get("mediaMetadata") or {}).get("creationTime")
-
-        if not (media_item_id and base_url and creation_time):
-            counts.failed += 1
-            failures.append(json_dumps_compact({"reason": "missing_required_fields", "item": item}))
-            continue
-
-        kst_date = iso_to_kst_date(creation_time)
-        folder_id = drive.ensure_date_folder(root_folder_id=drive_root_folder_id, date_folder_name=kst_date)
-
-        try:
-            if drive.already_uploaded(media_item_id=media_item_id):
-                counts.skipped += 1
-                continue
-
-            if args.dry_run:
-                counts.skipped += 1
-                continue
-
-            suffix = "=d" if mime_type.startswith("image/") else "=dv" if mime_type.startswith("video/") else "=d"
-            download_url = f"{base_url}{suffix}"
-
-            is_video = mime_type.startswith("video/")
-            dl_policy = RetryPolicy(max_retries=6, base_sleep_s=1.0, max_sleep_s=60.0) if is_video else RetryPolicy()
-            timeout_s = (10.0, 300.0) if is_video else (10.0, 60.0)
-
-            fd, tmp_path = tempfile.mkstemp(prefix="gphoto_", suffix=f"_{filename}")
-            os.close(fd)
+    def _record(result: tuple[str, str | None]) -> None:
+        status, failure = result
+        setattr(counts, status, getattr(counts, status) + 1)
+        if failure is not None:
+            failures.append(failure)
+
+    workers = max(1, args.workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight: set[Future] = set()
+        favorites = photos.search_favorites_by_date_range(start_date=start_date, end_date=end_date)
+        for page in chunked(favorites, PAGE_SIZE):
+            # One batched Drive round-trip answers the existence check for the whole page.
             try:
-                from gphoto_backup.utils import download_to_path
-
-                download_to_path(url=download_url, path=tmp_path, timeout_s=timeout_s, policy=dl_policy)
-
-                description_obj = {
-                    "mediaItem": {
-                        "id": media_item_id,
-                        "filename": filename,
-                        "productUrl": product_url,
-                        "baseUrl": base_url,
-                        "creationTime": creation_time,
-                        "mimeType": mime_type,
-                    }
-                }
-                file_id = drive.upload_file(
-                    local_path=tmp_path,
-                    filename=filename,
-                    mime_type=mime_type,
-                    parent_folder_id=folder_id,
-                    app_properties={
-                        "mediaItemId": media_item_id,
-                        "creationTime": creation_time,
-                        "mimeType": mime_type,
-                    },
-                    description_obj=description_obj,
-                    policy=RetryPolicy(max_retries=8, base_sleep_s=1.0, max_sleep_s=90.0) if is_video else RetryPolicy(),
-                    resumable=is_video,
+                drive.prefetch_existence(media_item_ids=[item["id"] for item in page if item.get("id")])
+            except Exception:
+                pass  # best-effort; uncached ids fall back to per-item lookups
+            # Resolve each distinct date folder once up front rather than from every worker.
+            try:
+                creation_times = {(item.get("mediaMetadata") or {}).get("creationTime") for item in page}
+                for kst_date in sorted({iso_to_kst_date(ct) for ct in creation_times if ct}):
+                    drive.ensure_date_folder(root_folder_id=drive_root_folder_id, date_folder_name=kst_date)
+            except Exception:
+                pass  # best-effort; each worker resolves (and reports) its own folder
+            for item in page:
+                counts.total += 1
+                in_flight.add(
+                    executor.submit(
+                        _process_item,
+                        item=item,
+                        drive=drive,
+                        session=session,
+                        drive_root_folder_id=drive_root_folder_id,
+                        dry_run=args.dry_run,
+                    )
                 )
-                _ = file_id
-                counts.uploaded += 1
-            finally:
-                try:
-                    os.remove(tmp_path)
-                except OSError:
-                    pass
-        except Exception as e:  # keep going for the rest
-            counts.failed += 1
-            failures.append(json_dumps_compact({"id": media_item_id, "error": repr(e)}))
+                # Keep the queue bounded so the search generator is not drained ahead of the workers.
+                if len(in_flight) >= workers * 2:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        _record(fut.result())
+        for fut in as_completed(in_flight):
+            _record(fut.result())
 
     today = kst_today().isoformat()
 
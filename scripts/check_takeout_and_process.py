@@ -3,16 +3,18 @@ from __future__ import annotations
 import argparse
 import email
 import imaplib
+import io
 import os
-import re
+import shutil
 import sys
 import tempfile
+import threading
 import zipfile
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
 from dataclasses import dataclass
 from datetime import datetime
-from hashlib import sha256
-from pathlib import Path
-from typing import Iterable, Optional
+from pathlib import Path, PurePosixPath
+from typing import Callable, Iterable, Iterator, Optional
 
 # Ensure repo root is importable when executed as a script path
 _REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -20,12 +22,31 @@ if _REPO_ROOT not in sys.path:
     sys.path.insert(0, _REPO_ROOT)
 
 from gphoto_backup.auth import GoogleOAuthSecrets, build_credentials
-from gphoto_backup.drive import DriveClient
+from gphoto_backup.drive import TAKEOUT_SOURCE, VIDEO_CHUNKSIZE, DriveClient
 from gphoto_backup.email_utils import SmtpConfig, send_email
-from gphoto_backup.utils import KST, RetryPolicy, iso_to_kst_date, json_dumps_compact, kst_today
+from gphoto_backup.utils import (
+    KST,
+    RetryPolicy,
+    iso_to_kst_date,
+    json_dumps_compact,
+    json_loads,
+    prefetched,
+    sha256_fileobj,
+)
 
 
 DRIVE_SCOPE = "https://www.googleapis.com/auth/drive"
+COPY_BUFSIZE = 8 * 1024 * 1024
+# Non-video entries up to this size are uploaded from memory instead of a temp file.
+IN_MEMORY_MAX_BYTES = 32 * 1024 * 1024
+# Favorite flags seen in Takeout sidecars; some exports use "starred" instead.
+_STARRED_KEYS = ("starred", "isStarred")
+_FAVORITE_KEYS = ("isFavorite", "favorite", "favorited", "is_favorite", *_STARRED_KEYS)
+_TRUTHY_STRINGS = frozenset(("true", "1", "yes", "y"))
+# Quoted key names as raw bytes; a sidecar containing none of them cannot be a favorite.
+_FAVORITE_KEY_TOKENS = tuple(f'"{k}"'.encode("ascii") for k in _FAVORITE_KEYS)
+# Keep concurrency modest to stay under Drive's per-user write rate limit.
+DEFAULT_WORKERS = 4
 
 
 @dataclass
@@ -57,6 +78,10 @@ def _append_actions_summary(md: str) -> None:
             f.write("\n")
 
 
+def _imap_quote(value: str) -> str:
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
 def _imap_find_takeout_ready(
     *,
     host: str,
@@ -73,21 +98,31 @@ def _imap_find_takeout_ready(
         imap.login(user, password)
         imap.select(mailbox)
 
-        # IMAP SEARCH is limited; keep it simple and filter in Python.
-        typ, data = imap.search(None, "UNSEEN")
+        # Narrow by sender server-side so only candidate headers are fetched. Subject
+        # keywords (some non-ASCII) are still matched in Python: a portable SEARCH can
+        # carry only one UTF-8 literal per command.
+        criteria = ["UNSEEN"]
+        if from_contains:
+            criteria += ["FROM", _imap_quote(from_contains)]
+        typ, data = imap.search(None, *criteria)
         if typ != "OK":
             return False
         ids = (data[0] or b"").split()
         if not ids:
             return False
 
+        # One FETCH for all candidates, and only the two headers we read.
+        typ, parts = imap.fetch(b",".join(ids[-50:]), "(BODY.PEEK[HEADER.FIELDS (SUBJECT FROM)])")  # cap scan
+        if typ != "OK" or not parts:
+            return False
+
         matched = []
-        for msg_id in ids[-50:]:  # cap scan
-            typ, parts = imap.fetch(msg_id, "(BODY.PEEK[HEADER])")
-            if typ != "OK" or not parts or not isinstance(parts[0], tuple):
+        for part in parts:
+            # Each message is a (b"<id> (BODY[...] {n}", header_bytes) tuple; b")" separators are skipped.
+            if not isinstance(part, tuple):
                 continue
-            raw = parts[0][1]
-            msg = email.message_from_bytes(raw)
+            msg_id = part[0].split(None, 1)[0]
+            msg = email.message_from_bytes(part[1])
             subj = (msg.get("Subject") or "").strip()
             frm = (msg.get("From") or "").strip().lower()
             if from_contains and from_contains.lower() not in frm:
@@ -100,35 +135,30 @@ def _imap_find_takeout_ready(
             return False
 
         # Mark matched as Seen (best-effort)
-        for msg_id in matched:
-            imap.store(msg_id, "+FLAGS", "\\Seen")
+        imap.store(b",".join(matched), "+FLAGS", "\\Seen")
         return True
 
 
 def _parse_favorite_flag(meta: dict) -> bool:
-    # Takeout JSON varies; handle common shapes.
-    for key in ("isFavorite", "favorite", "favorited", "is_favorite"):
-        if key in meta:
-            v = meta.get(key)
-            if isinstance(v, bool):
-                return v
-            if isinstance(v, str):
-                return v.strip().lower() in ("true", "1", "yes", "y")
-            if isinstance(v, (int, float)):
-                return bool(v)
-
-    # Some exports include "starred" or similar flags
-    for key in ("starred", "isStarred"):
-        if key in meta:
-            v = meta.get(key)
-            if isinstance(v, bool):
-                return v
-            if isinstance(v, str):
-                return v.strip().lower() in ("true", "1", "yes", "y")
+    # Takeout JSON varies; the first recognised key present decides.
+    for key in _FAVORITE_KEYS:
+        v = meta.get(key)
+        if v is None:
+            continue
+        if v is True or v is False:
+            return v
+        if isinstance(v, str):
+            return v.strip().lower() in _TRUTHY_STRINGS
+        if isinstance(v, (int, float)) and key not in _STARRED_KEYS:
+            return bool(v)
     return False
 
 
-def _extract_taken_time_iso(meta: dict) -> Optional[str]:
+def _ts_to_kst_date(ts: int) -> str:
+    return datetime.fromtimestamp(ts, tz=KST).date().isoformat()
+
+
+def _extract_taken_kst_date(meta: dict) -> Optional[str]:
     # Prefer taken time fields commonly found in Takeout.
     candidates = [
         ("photoTakenTime", "timestamp"),
@@ -140,15 +170,14 @@ def _extract_taken_time_iso(meta: dict) -> Optional[str]:
         if isinstance(obj, dict) and ts_key in obj:
             ts = obj.get(ts_key)
             try:
-                ts_int = int(ts)
-                return datetime.fromtimestamp(ts_int, tz=KST).astimezone(KST).isoformat()
+                return _ts_to_kst_date(int(ts))
             except Exception:
                 pass
 
     # Some files include RFC3339-like "creationTime"
     ct = meta.get("mediaMetadata", {}).get("creationTime") if isinstance(meta.get("mediaMetadata"), dict) else None
     if isinstance(ct, str) and ct:
-        return ct
+        return iso_to_kst_date(ct)
     return None
 
 
@@ -163,11 +192,20 @@ def _build_arg_parser() -> argparse.ArgumentParser:
     p.add_argument("--dry-run", action="store_true", help="Do not upload; only parse and count.")
     p.add_argument("--force", action="store_true", help="Process Drive Takeout exports even without Gmail trigger.")
     p.add_argument("--max-zips", type=int, default=5, help="Max number of Takeout zip files to process per run.")
+    p.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"Concurrent hash/upload workers per zip (default: {DEFAULT_WORKERS}).",
+    )
     return p
 
 
 def main() -> int:
     args = _build_arg_parser().parse_args()
+    # One timestamp for the whole run: processed-zip markers and the report date.
+    run_start = datetime.now(tz=KST)
+    run_start_iso = run_start.isoformat()
 
     smtp = SmtpConfig(
         host=_env("SMTP_HOST"),
@@ -245,7 +283,12 @@ def main() -> int:
     failures: list[str] = []
 
     # Find candidate zip files in Takeout source folder that are not processed yet
-    children = drive.list_children(folder_id=takeout_source_folder_id)
+    children = drive.list_children(
+        folder_id=takeout_source_folder_id,
+        fields="nextPageToken,files(id,name,mimeType,modifiedTime,appProperties)",
+        # Oldest first; filtering below keeps this order.
+        order_by="modifiedTime,name",
+    )
     zips = [
         f
         for f in children
@@ -254,28 +297,59 @@ def main() -> int:
     counts.takeout_files_seen = len(zips)
 
     def is_processed(f: dict) -> bool:
-        ap = f.get("appProperties") or {}
-        return isinstance(ap, dict) and ap.get("takeoutProcessed") == "true"
+        return (f.get("appProperties") or {}).get("takeoutProcessed") == "true"
 
     pending = [f for f in zips if not is_processed(f)]
-    pending.sort(key=lambda x: (x.get("modifiedTime") or "", x.get("name") or ""))
     pending = pending[: max(0, args.max_zips)]
 
+    # Every uploaded sha256 in one paginated listing instead of one query per favorite.
+    # If the listing fails, workers fall back to one sha256 query per favorite.
+    existing_sha256s: set[str] = set()
+    sha256s_listed = False
+    sha256_prefetch_error: Optional[str] = None
+    if pending:
+        # Only list the backup root's date folders when there is something to file.
+        drive.warm_date_folders(root_folder_id=backup_root_folder_id)
+        try:
+            existing_sha256s = drive.list_existing_sha256s()
+            sha256s_listed = True
+        except Exception as e:
+            # Only a cache warm-up; report it, but it is not a failed item.
+            sha256_prefetch_error = repr(e)
+
     with tempfile.TemporaryDirectory(prefix="takeout_") as td:
         td_path = Path(td)
-        for f in pending:
-            file_id = f.get("id")
+        # At most two zips on disk: the one being processed and the next one downloading.
+        disk_slots = threading.BoundedSemaphore(2)
+
+        def _download_pending() -> Iterator[tuple[dict, Path, Optional[BaseException]]]:
+            for f in pending:
+                if not f.get("id"):
+                    continue
+                # Drive allows duplicate names; the id keeps concurrent zips apart.
+                zip_path = td_path / f"{f['id']}_{_safe_drive_filename(f.get('name') or 'takeout.zip')}"
+                disk_slots.acquire()
+                try:
+                    drive.download_file(file_id=f["id"], dest_path=str(zip_path), policy=RetryPolicy(max_retries=6))
+                except Exception as e:
+                    try:
+                        os.remove(zip_path)  # drop the partial download before freeing its slot
+                    except OSError:
+                        pass
+                    disk_slots.release()
+                    yield f, zip_path, e
+                    continue
+                yield f, zip_path, None
+
+        # Download zip N+1 on a background thread while zip N is processed.
+        for f, zip_path, download_err in prefetched(_download_pending(), depth=1):
+            file_id = f["id"]
             name = f.get("name") or "takeout.zip"
-            if not file_id:
-                continue
             counts.takeout_files_processed += 1
 
-            zip_path = td_path / _safe_drive_filename(name)
-            try:
-                drive.download_file(file_id=file_id, dest_path=str(zip_path), policy=RetryPolicy(max_retries=6))
-            except Exception as e:
+            if download_err is not None:
                 counts.failed += 1
-                failures.append(json_dumps_compact({"takeoutZip": name, "error": repr(e)}))
+                failures.append(json_dumps_compact({"takeoutZip": name, "error": repr(download_err)}))
                 continue
 
             try:
@@ -286,23 +360,34 @@ def main() -> int:
                     counts=counts,
                     failures=failures,
                     dry_run=args.dry_run,
+                    workers=args.workers,
+                    existing_sha256s=existing_sha256s,
+                    sha256s_listed=sha256s_listed,
                 )
 
                 # Mark zip as processed to make daily polling idempotent.
                 try:
-                    ap = f.get("appProperties") or {}
-                    if not isinstance(ap, dict):
-                        ap = {}
-                    ap["takeoutProcessed"] = "true"
-                    ap["takeoutProcessedAt"] = datetime.now(tz=KST).isoformat()
-                    drive.update_app_properties(file_id=file_id, app_properties=ap)  # best-effort
+                    # appProperties merge on update, so send only the keys being set.
+                    drive.update_app_properties(
+                        file_id=file_id,
+                        app_properties={
+                            "takeoutProcessed": "true",
+                            "takeoutProcessedAt": run_start_iso,
+                        },
+                    )  # best-effort
                 except Exception:
                     pass
             except Exception as e:
                 counts.failed += 1
                 failures.append(json_dumps_compact({"takeoutZip": name, "error": repr(e)}))
+            finally:
+                try:
+                    os.remove(zip_path)
+                except OSError:
+                    pass
+                disk_slots.release()
 
-    today = kst_today().isoformat()
+    today = run_start.date().isoformat()
     subject = f"[GooglePhotoBackup] {today} Takeout 처리 결과"
     warning = "WARNING: 실패가 있습니다.\n\n" if counts.failed else ""
     body = warning + "\n".join(
@@ -316,6 +401,8 @@ def main() -> int:
             f"모드: {'dry-run' if args.dry_run else 'upload'}",
         ]
     )
+    if sha256_prefetch_error:
+        body += f"\nsha256 prefetch: unavailable ({sha256_prefetch_error})"
     send_email(smtp=smtp, to_addrs=email_to, subject=subject, body_text=body + "\n")
 
     summary_lines = [
@@ -330,6 +417,8 @@ def main() -> int:
         f"- **Failed**: {counts.failed}",
         "",
     ]
+    if sha256_prefetch_error:
+        summary_lines += [f"- **sha256 prefetch**: unavailable ({sha256_prefetch_error})", ""]
     if failures:
         summary_lines += ["### Failures (sample)", "```", "\n".join(failures[:20]), "```", ""]
     _append_actions_summary("\n".join(summary_lines))
@@ -345,119 +434,210 @@ def _process_zip(
     counts: Counts,
     failures: list[str],
     dry_run: bool,
+    existing_sha256s: set[str],
+    sha256s_listed: bool,
+    workers: int = DEFAULT_WORKERS,
 ) -> None:
+    # Metadata is parsed on this thread; hashing, extraction and upload of each
+    # favorite run on a thread pool. ZipFile handles are not safe to share across
+    # threads, so each worker opens its own.
+    local = threading.local()
+    handles: list[zipfile.ZipFile] = []
+    handles_lock = threading.Lock()
+    # Guards existing_sha256s, which workers also use to reserve hashes they are uploading.
+    sha256s_lock = threading.Lock()
+
+    def _open_zip() -> zipfile.ZipFile:
+        zf = getattr(local, "zip", None)
+        if zf is None:
+            zf = zipfile.ZipFile(zip_path, "r", allowZip64=True)
+            local.zip = zf
+            with handles_lock:
+                handles.append(zf)
+        return zf
+
+    def _record(result: tuple[str, str | None]) -> None:
+        status, failure = result
+        setattr(counts, status, getattr(counts, status) + 1)
+        if failure is not None:
+            failures.append(failure)
+
+    workers = max(1, workers)
     # Heuristic: Takeout photos are under a folder containing "Google Photos"
-    with zipfile.ZipFile(zip_path, "r") as z:
-        names = z.namelist()
-        json_names = [n for n in names if n.lower().endswith(".json")]
-
-        # Map media path (without .json) -> json path
-        json_by_base: dict[str, str] = {}
-        for jn in json_names:
-            base = re.sub(r"\.json$", "", jn, flags=re.IGNORECASE)
-            json_by_base[base] = jn
-
-        for base, jn in json_by_base.items():
-            try:
-                with z.open(jn) as jf:
-                    import json as _json
-
-                    meta = _json.load(jf)
-            except Exception:
-                continue
-
-            if not isinstance(meta, dict):
-                continue
-            if not _parse_favorite_flag(meta):
-                continue
-            counts.favorites_found += 1
-
-            # Find the media file entry. Commonly the base path exists exactly.
-            media_name = None
-            if base in names:
-                media_name = base
-            else:
-                # Some takeouts add suffixes; try matching by stem.
-                base_stem = Path(base).name
-                for n in names:
-                    if Path(n).name == base_stem:
-                        media_name = n
-                        break
-            if not media_name:
-                counts.failed += 1
-                failures.append(json_dumps_compact({"reason": "media_not_found", "json": jn}))
-                continue
-
-            taken_iso = _extract_taken_time_iso(meta)
-            if not taken_iso:
-                counts.failed += 1
-                failures.append(json_dumps_compact({"reason": "taken_time_not_found", "json": jn}))
-                continue
-
-            # Use KST date folder from taken time
-            try:
-                # taken_iso might be tz-aware isoformat; convert to date string
-                dt = datetime.fromisoformat(taken_iso)
-                kst_date = dt.astimezone(KST).date().isoformat()
-            except Exception:
-                # fallback for RFC3339
-                kst_date = iso_to_kst_date(taken_iso)
+    try:
+        with zipfile.ZipFile(zip_path, "r", allowZip64=True) as z, ThreadPoolExecutor(max_workers=workers) as executor:
+            in_flight: set[Future] = set()
+            # One pass over the central directory. Zip member names are always POSIX paths.
+            names = z.namelist()
+            names_set = set(names)
+            names_by_stem: dict[str, str] = {}  # first entry per file name, for the suffix fallback
+            json_by_base: dict[str, str] = {}  # media path (without .json) -> json path
+            for n in names:
+                names_by_stem.setdefault(PurePosixPath(n).name, n)
+                if n.lower().endswith(".json"):
+                    json_by_base[n[:-5]] = n
+
+            favorites: list[tuple[int, str, str, dict, str]] = []
+            for base, jn in json_by_base.items():
+                try:
+                    with z.open(jn) as jf:
+                        raw = jf.read()
+                    # Most sidecars are not favorites; reject them before paying for a full parse.
+                    if not any(tok in raw for tok in _FAVORITE_KEY_TOKENS):
+                        continue
+                    meta = json_loads(raw)
+                except Exception:
+                    continue
 
-            folder_id = drive.ensure_date_folder(root_folder_id=backup_root_folder_id, date_folder_name=kst_date)
+                if not isinstance(meta, dict):
+                    continue
+                if not _parse_favorite_flag(meta):
+                    continue
+                counts.favorites_found += 1
+
+                # Find the media file entry. Commonly the base path exists exactly.
+                media_name = None
+                if base in names_set:
+                    media_name = base
+                else:
+                    # Some takeouts add suffixes; try matching by stem.
+                    media_name = names_by_stem.get(PurePosixPath(base).name)
+                if not media_name:
+                    counts.failed += 1
+                    failures.append(json_dumps_compact({"reason": "media_not_found", "json": jn}))
+                    continue
 
-            filename = _safe_drive_filename(meta.get("title") or Path(media_name).name)
-            mime_type = (meta.get("mimeType") or meta.get("mime_type") or "").strip() or "application/octet-stream"
+                # Use KST date folder from taken time
+                kst_date = _extract_taken_kst_date(meta)
+                if not kst_date:
+                    counts.failed += 1
+                    failures.append(json_dumps_compact({"reason": "taken_time_not_found", "json": jn}))
+                    continue
 
+                favorites.append((z.getinfo(media_name).header_offset, media_name, jn, meta, kst_date))
+
+            # Extract in archive order so the workers read the zip near-sequentially.
+            favorites.sort(key=lambda fav: fav[0])
+            for _offset, media_name, jn, meta, kst_date in favorites:
+                in_flight.add(
+                    executor.submit(
+                        _process_one_favorite,
+                        open_zip=_open_zip,
+                        zip_name=zip_path.name,
+                        media_name=media_name,
+                        jn=jn,
+                        meta=meta,
+                        kst_date=kst_date,
+                        drive=drive,
+                        backup_root_folder_id=backup_root_folder_id,
+                        dry_run=dry_run,
+                        existing_sha256s=existing_sha256s,
+                        sha256s_listed=sha256s_listed,
+                        sha256s_lock=sha256s_lock,
+                    )
+                )
+                # Keep the queue bounded so pending uploads don't pile up ahead of the workers.
+                if len(in_flight) >= workers * 2:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        _record(fut.result())
+            for fut in as_completed(in_flight):
+                _record(fut.result())
+    finally:
+        for zf in handles:
+            zf.close()
+
+
+def _process_one_favorite(
+    *,
+    open_zip: Callable[[], zipfile.ZipFile],
+    zip_name: str,
+    media_name: str,
+    jn: str,
+    meta: dict,
+    kst_date: str,
+    drive: DriveClient,
+    backup_root_folder_id: str,
+    dry_run: bool,
+    existing_sha256s: set[str],
+    sha256s_listed: bool,
+    sha256s_lock: threading.Lock,
+) -> tuple[str, str | None]:
+    # Returns (Counts field to increment, failure line or None); runs on a worker thread.
+    z = open_zip()
+    filename = _safe_drive_filename(meta.get("title") or PurePosixPath(media_name).name)
+    mime_type = (meta.get("mimeType") or meta.get("mime_type") or "").strip() or "application/octet-stream"
+
+    try:
+        # Hash straight from the zip stream; duplicates (the steady state for
+        # recurring Takeouts) never get extracted to disk.
+        with z.open(media_name) as mf:
+            sha_hex = sha256_fileobj(mf)
+    except Exception as e:
+        return "failed", json_dumps_compact({"reason": "hash_failed", "file": media_name, "error": repr(e)})
+    with sha256s_lock:
+        if sha_hex in existing_sha256s or dry_run:
+            return "skipped", None
+    if not sha256s_listed:
+        try:
+            if drive.already_uploaded_by_sha256(sha256_hex=sha_hex):
+                return "skipped", None
+        except Exception as e:
+            return "failed", json_dumps_compact({"reason": "lookup_failed", "file": media_name, "error": repr(e)})
+
+    # Reserve the hash before uploading so another worker holding the same bytes
+    # (e.g. a photo under both a year folder and an album) skips it.
+    with sha256s_lock:
+        if sha_hex in existing_sha256s:
+            return "skipped", None
+        existing_sha256s.add(sha_hex)
+
+    is_video = mime_type.startswith("video/")
+    description_obj = {
+        "source": TAKEOUT_SOURCE,
+        "takeout": {"zip": zip_name, "path": media_name, "metaPath": jn},
+        "meta": meta,
+        "sha256": sha_hex,
+        "takenTimeKstDate": kst_date,
+    }
+    try:
+        folder_id = drive.ensure_date_folder(root_folder_id=backup_root_folder_id, date_folder_name=kst_date)
+        upload_kwargs = dict(
+            filename=filename,
+            mime_type=mime_type,
+            parent_folder_id=folder_id,
+            app_properties={
+                "source": TAKEOUT_SOURCE,
+                "sha256": sha_hex,
+                "takenKstDate": kst_date,
+            },
+            description_obj=description_obj,
+            policy=RetryPolicy(max_retries=8, base_sleep_s=1.0, max_sleep_s=90.0) if is_video else RetryPolicy(),
+            resumable=is_video,
+            chunksize=VIDEO_CHUNKSIZE,
+        )
+        if not is_video and z.getinfo(media_name).file_size <= IN_MEMORY_MAX_BYTES:
+            # Small media: decompress straight into memory and upload from there.
+            drive.upload_stream(fileobj=io.BytesIO(z.read(media_name)), **upload_kwargs)
+        else:
+            # Large/resumable media: stage on disk so memory stays bounded and chunks can be re-read.
             with tempfile.NamedTemporaryFile(prefix="takeout_item_", delete=False) as tf:
                 tmp_path = tf.name
             try:
-                # Extract media to temp file and hash it
-                h = sha256()
                 with z.open(media_name) as mf, open(tmp_path, "wb") as out:
-                    for chunk in iter(lambda: mf.read(1024 * 1024), b""):
-                        out.write(chunk)
-                        h.update(chunk)
-                sha_hex = h.hexdigest()
-
-                if drive.already_uploaded_by_sha256(sha256_hex=sha_hex):
-                    counts.skipped += 1
-                    continue
-                if dry_run:
-                    counts.skipped += 1
-                    continue
-
-                description_obj = {
-                    "source": "google_takeout",
-                    "takeout": {"zip": zip_path.name, "path": media_name, "metaPath": jn},
-                    "meta": meta,
-                    "sha256": sha_hex,
-                    "takenTimeKstDate": kst_date,
-                }
-                drive.upload_file(
-                    local_path=tmp_path,
-                    filename=filename,
-                    mime_type=mime_type,
-                    parent_folder_id=folder_id,
-                    app_properties={
-                        "source": "google_takeout",
-                        "sha256": sha_hex,
-                        "takenKstDate": kst_date,
-                    },
-                    description_obj=description_obj,
-                    policy=RetryPolicy(max_retries=8, base_sleep_s=1.0, max_sleep_s=90.0)
-                    if mime_type.startswith("video/")
-                    else RetryPolicy(),
-                    resumable=mime_type.startswith("video/"),
-                )
-                counts.uploaded += 1
-            except Exception as e:
-                counts.failed += 1
-                failures.append(json_dumps_compact({"reason": "upload_failed", "file": media_name, "error": repr(e)}))
+                    shutil.copyfileobj(mf, out, length=COPY_BUFSIZE)
+                drive.upload_file(local_path=tmp_path, **upload_kwargs)
             finally:
                 try:
                     os.remove(tmp_path)
                 except OSError:
                     pass
+        return "uploaded", None
+    except Exception as e:
+        # Release the reservation so a later copy of the same bytes can retry the upload.
+        with sha256s_lock:
+            existing_sha256s.discard(sha_hex)
+        return "failed", json_dumps_compact({"reason": "upload_failed", "file": media_name, "error": repr(e)})
 
 
 if __name__ == "__main__":